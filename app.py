@@ -1,147 +1,250 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import pdfplumber
+import xlsxwriter
 import re
-from rapidfuzz import process
+from rapidfuzz import process, fuzz
 from io import BytesIO
 from datetime import datetime
 import os
+import functools
+
+# ------------------------------
+# Precompiled patterns
+# ------------------------------
+# One pass over a page's text, anchored per line. Each alternative is a
+# statement style; m.lastgroup names the one that matched. Both styles start
+# with a digit, so the (?=\d) gate rejects headers, totals and labels once
+# instead of once per alternative.
+#   hdfc: HDFC / ICICI / BoB  "dd/mm/yyyy  MERCHANT  1,234.56 CR"
+#   amex: AMEX                "DD Month [DD Month] MERCHANT 1,234.56 [CR]"
+_TXN_RE = re.compile(
+    r"^[ \t]*(?=\d)(?:"
+    r"(?P<hdfc>(?P<hdfc_date>\d{2}/\d{2}/\d{4})[ \t]+(?P<hdfc_merchant>.+?)[ \t]+"
+    r"(?P<hdfc_amount>[\d,]+\.\d{2})[ \t]?(?P<hdfc_drcr>CR|DR)?)"
+    r"|(?P<amex>(?P<amex_date>\d{1,2}[ \t]+[A-Za-z]{3,9})(?:[ \t]+\d{1,2}[ \t]+[A-Za-z]{3,9})?[ \t]+"
+    r"(?P<amex_merchant>.+?)[ \t]+(?P<amex_amount>[\d,]+\.\d{2})[ \t]*(?P<amex_cr>CR|Cr)?[ \t]*$)"
+    r")",
+    re.MULTILINE,
+)
+# Credit markers: anywhere on an AMEX line ("CR" also covers "CREDIT"),
+# or in a table row's narration
+_CREDIT_RE = re.compile(r"CR|PAYMENT RECEIVED", re.IGNORECASE)
+_CREDIT_NARRATION_RE = re.compile(r"CREDIT|PAYMENT RECEIVED", re.IGNORECASE)
+# Numeric part of a table amount cell
+_PAT_AMOUNT = re.compile(r"[\d.,]+")
 
 # ==============================
 # Load vendor mapping
 # ==============================
 VENDOR_FILE = "vendors.csv"
-if os.path.exists(VENDOR_FILE):
-    vendor_map = pd.read_csv(VENDOR_FILE)
-else:
-    vendor_map = pd.DataFrame(columns=["merchant", "category"])
-    vendor_map.to_csv(VENDOR_FILE, index=False)
+
+def _build_vendor_index(vendor_map):
+    """Lowercased merchants (fuzzy-match choices) and a merchant -> category lookup."""
+    lowers = vendor_map["merchant"].str.lower().tolist()
+    return lowers, dict(zip(lowers, vendor_map["category"]))
+
+@st.cache_data(show_spinner=False)
+def load_vendor_map(path, mtime):
+    """Parse vendors.csv and index it once per file version; mtime is only the cache key."""
+    vendor_map = pd.read_csv(path)
+    return (vendor_map, *_build_vendor_index(vendor_map))
+
+if not os.path.exists(VENDOR_FILE):
+    pd.DataFrame(columns=["merchant", "category"]).to_csv(VENDOR_FILE, index=False)
+
+# Streamlit hands back a fresh copy on every rerun, so this is the run's
+# working copy: add_new_vendor updates the index in place and
+# save_vendor_map writes it back. Queries are lowercased the same way, so
+# rapidfuzz is called with processor=None and never re-normalizes choices.
+_VENDOR_MTIME = os.path.getmtime(VENDOR_FILE)
+vendor_map, _VENDOR_LOWERS, _VENDOR_CAT = load_vendor_map(VENDOR_FILE, _VENDOR_MTIME)
 
 # ------------------------------
 # Fuzzy matching to find category
 # ------------------------------
+def _categories_for(merchants):
+    """Categories for already-lowercased merchants, as an object array."""
+    # Exact vendor hits are a dict lookup; the rest are scored against every
+    # vendor in one rapidfuzz call and take the best match at or above 80
+    result = np.full(len(merchants), "Others", dtype=object)
+    fuzzy = []
+    for i, m in enumerate(merchants):
+        if m in _VENDOR_CAT:
+            result[i] = _VENDOR_CAT[m]
+        else:
+            fuzzy.append(i)
+    if fuzzy and _VENDOR_LOWERS:
+        scores = process.cdist([merchants[i] for i in fuzzy], _VENDOR_LOWERS, scorer=fuzz.WRatio, processor=None, score_cutoff=80, workers=-1)
+        best = scores.argmax(axis=1)
+        top = scores[np.arange(len(fuzzy)), best]
+        categories = np.array([_VENDOR_CAT[v] for v in _VENDOR_LOWERS], dtype=object)
+        result[fuzzy] = np.where(top >= 80, categories[best], "Others")
+    return result
+
 def get_category(merchant):
-    m = str(merchant).lower()
-    matches = process.extractOne(
-        m,
-        vendor_map["merchant"].str.lower().tolist(),
-        score_cutoff=80
-    )
-    if matches:
-        matched_merchant = matches[0]
-        category = vendor_map.loc[
-            vendor_map["merchant"].str.lower() == matched_merchant, "category"
-        ].iloc[0]
-        return category
-    return "Others"
+    return _categories_for([str(merchant).lower()])[0]
 
 # ------------------------------
 # Date Parser
 # ------------------------------
+_DMY = "%d/%m/%Y"
+_MONTH_DAY_FORMATS = ("%b %d %Y", "%B %d %Y")
+_DAY_MONTH_FORMATS = ("%d %b %Y", "%d %B %Y")
+
+@functools.lru_cache(maxsize=4096)
 def parse_date(date_str):
     """Handle dd/mm/yyyy, Month DD, DD Month formats."""
-    try:
-        return datetime.strptime(date_str, "%d/%m/%Y").strftime("%d/%m/%Y")
-    except:
-        for fmt in ["%b %d", "%B %d", "%d %b", "%d %B"]:
-            try:
-                return datetime.strptime(date_str + " 2025", f"{fmt} %Y").strftime("%d/%m/%Y")
-            except:
-                pass
-        return date_str
+    # Only try the formats the string can possibly match: statements repeat
+    # the same few dates, and each failed strptime raises an exception
+    if "/" in date_str:
+        try:
+            return datetime.strptime(date_str, _DMY).strftime(_DMY)
+        except:
+            return date_str
+    fmts = _DAY_MONTH_FORMATS if date_str[:1].isdigit() else _MONTH_DAY_FORMATS
+    for fmt in fmts:
+        try:
+            return datetime.strptime(date_str + " 2025", fmt).strftime(_DMY)
+        except:
+            pass
+    return date_str
 
 # ------------------------------
 # Extract transactions from PDF (supports HDFC/ICICI/BoB + AMEX)
 # ------------------------------
-def extract_transactions_from_pdf(pdf_file, account_name, debug=False):
-    transactions = []
-    with pdfplumber.open(pdf_file) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            tables = page.extract_tables()
-            extracted_from_table = False
-            if tables:
-                for table in tables:
-                    if len(table) < 2:
-                        continue
-                    header = [h.lower() if h else '' for h in table[0]]
-                    date_idx = next((i for i, h in enumerate(header) if 'date' in h or 'detail' in h), None)  # Flexible for 'Details'
-                    merch_idx = next((i for i, h in enumerate(header) if 'desc' in h or 'narr' in h or 'merchant' in h), None)
-                    amt_idx = next((i for i, h in enumerate(header) if 'amount' in h), None)
-                    type_idx = next((i for i, h in enumerate(header) if 'cr' in h or 'dr' in h or 'type' in h), None)
-                    
-                    if date_idx is None or merch_idx is None or amt_idx is None:
-                        continue  # Not a transaction table
-                    
-                    for row in table[1:]:  # Skip header
-                        if len(row) < max(date_idx, merch_idx, amt_idx) + 1:
-                            continue
-                        date = row[date_idx].strip() if row[date_idx] else ''
-                        merchant = row[merch_idx].strip() if row[merch_idx] else ''
-                        amount_str = row[amt_idx].strip() if row[amt_idx] else ''
-                        drcr = row[type_idx].strip() if type_idx is not None and row[type_idx] else 'DR'
-                        
-                        if not date or not merchant or not amount_str:
-                            continue
-                        
-                        try:
-                            amt_match = re.search(r'[\d.,]+', amount_str.replace(',', ''))
-                            amt = float(amt_match.group())
-                        except:
-                            continue
-                        
-                        # Detect credits more robustly
-                        if drcr.upper() == 'CR' or 'CR' in amount_str.upper() or 'CREDIT' in merchant.upper() or 'PAYMENT RECEIVED' in merchant.upper():
-                            amt = -amt
-                            drcr = 'CR'
-                        
-                        transactions.append([parse_date(date), merchant, round(amt, 2), drcr, account_name])
-                    extracted_from_table = True
+def _parse_page(page):
+    """Parse one pdfplumber page. Returns (columns, tables, text); text is None when the tables were used.
+    columns is (dates, merchants, amounts, types); amounts are left as the matched text and converted
+    in bulk by extract_transactions_from_pdf."""
+    dates, merchants, amounts, types = [], [], [], []
+    columns = (dates, merchants, amounts, types)
+    text = None
+    if not page.chars:
+        # Scanned / image-only page: no text layer to find tables or lines in
+        return columns, [], text
+    tables = page.extract_tables()
+    extracted_from_table = False
+    if tables:
+        for table in tables:
+            if len(table) < 2:
+                continue
+            header = [h.lower() if h else '' for h in table[0]]
+            date_idx = next((i for i, h in enumerate(header) if 'date' in h or 'detail' in h), None)  # Flexible for 'Details'
+            merch_idx = next((i for i, h in enumerate(header) if 'desc' in h or 'narr' in h or 'merchant' in h), None)
+            amt_idx = next((i for i, h in enumerate(header) if 'amount' in h), None)
+            type_idx = next((i for i, h in enumerate(header) if 'cr' in h or 'dr' in h or 'type' in h), None)
             
-            if not extracted_from_table:
-                # Fallback to original text-based parsing if no tables found
-                text = page.extract_text()
-                if debug and text:
-                    st.write(f"🔎 Debug Text Page {page_num}", text.split("\n")[:20])
-
-                if not text:
+            if date_idx is None or merch_idx is None or amt_idx is None:
+                continue  # Not a transaction table
+            
+            for row in table[1:]:  # Skip header
+                if len(row) < max(date_idx, merch_idx, amt_idx) + 1:
+                    continue
+                date = row[date_idx].strip() if row[date_idx] else ''
+                merchant = row[merch_idx].strip() if row[merch_idx] else ''
+                amount_str = row[amt_idx].strip() if row[amt_idx] else ''
+                drcr = row[type_idx].strip() if type_idx is not None and row[type_idx] else 'DR'
+                
+                if not date or not merchant or not amount_str:
+                    continue
+                
+                amt_match = _PAT_AMOUNT.search(amount_str.replace(',', ''))
+                if not amt_match:
                     continue
+                
+                # Detect credits more robustly
+                if drcr.upper() == 'CR' or 'CR' in amount_str.upper() or _CREDIT_NARRATION_RE.search(merchant):
+                    drcr = 'CR'
+                
+                dates.append(parse_date(date))
+                merchants.append(merchant)
+                amounts.append(amt_match.group())
+                types.append(drcr)
+            extracted_from_table = True
+    
+    if not extracted_from_table:
+        # Fallback to original text-based parsing if no tables found
+        text = page.extract_text()
+        if not text:
+            return columns, tables, text
 
-                lines = [l.strip() for l in text.split("\n") if l.strip()]
-
-                for line in lines:
-                    # ----------------------------
-                    # 1️⃣ HDFC / ICICI / BoB style
-                    # ----------------------------
-                    m1 = re.match(r"(\d{2}/\d{2}/\d{4})\s+(.+?)\s+([\d,]+\.\d{2})\s?(CR|DR)?", line)
-                    if m1:
-                        date, merchant, amount, drcr = m1.groups()
-                        amt = float(amount.replace(",", ""))
-                        if drcr and drcr.upper() == "CR":
-                            amt = -amt
-                        transactions.append([parse_date(date), merchant.strip(), round(amt, 2), drcr if drcr else "DR", account_name])
-                        continue
-
-                    # ----------------------------
-                    # 2️⃣ AMEX style (DD Month ... with optional posting date and CR suffix)
-                    # ----------------------------
-                    m2 = re.match(r"(\d{1,2}\s+[A-Za-z]{3,9})(?:\s+\d{1,2}\s+[A-Za-z]{3,9})?\s+(.+?)\s+([\d,]+\.\d{2})\s*(CR|Cr)?$", line)
-                    if m2:
-                        date_str, merchant, amount, cr_suffix = m2.groups()
-                        amt = float(amount.replace(",", ""))
-                        drcr = "DR"
-                        # Detect credits
-                        if cr_suffix or "CR" in line.upper() or "CREDIT" in line.upper() or "PAYMENT RECEIVED" in line.upper():
-                            amt = -amt
-                            drcr = "CR"
-                        transactions.append([parse_date(date_str), merchant.strip(), round(amt, 2), drcr, account_name])
-                        continue
-
-            if debug:
-                st.write(f"🔎 Debug Tables Page {page_num}", tables[:2] if tables else "No tables detected")  # Print sample tables
-            
-            st.info(f"📄 Page {page_num}: extracted {len(transactions)} rows so far")
+        for m in _TXN_RE.finditer(text):
+            if m.lastgroup == "hdfc":
+                # ----------------------------
+                # 1️⃣ HDFC / ICICI / BoB style
+                # ----------------------------
+                drcr = m["hdfc_drcr"]
+                dates.append(parse_date(m["hdfc_date"]))
+                merchants.append(m["hdfc_merchant"].strip())
+                amounts.append(m["hdfc_amount"])
+                types.append(drcr if drcr else "DR")
+            else:
+                # ----------------------------
+                # 2️⃣ AMEX style (DD Month ... with optional posting date and CR suffix)
+                # ----------------------------
+                line = m["amex"]
+                drcr = "DR"
+                # Detect credits
+                if m["amex_cr"] or _CREDIT_RE.search(line):
+                    drcr = "CR"
+                dates.append(parse_date(m["amex_date"]))
+                merchants.append(m["amex_merchant"].strip())
+                amounts.append(m["amex_amount"])
+                types.append(drcr)
 
-    return pd.DataFrame(transactions, columns=["Date", "Merchant", "Amount", "Type", "Account"])
+    return columns, tables, text
+
+def _read_pdf_bytes(pdf_file):
+    """Read the whole statement into memory once; pdfminer's many small seeks/reads then hit a BytesIO."""
+    if hasattr(pdf_file, "getvalue"):  # Streamlit UploadedFile / BytesIO
+        return pdf_file.getvalue()
+    if hasattr(pdf_file, "read"):
+        return pdf_file.read()
+    with open(pdf_file, "rb") as f:
+        return f.read()
+
+def extract_transactions_from_pdf(pdf_file, account_name, debug=False):
+    data = _read_pdf_bytes(pdf_file)
+    results = []
+    with pdfplumber.open(BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+        for page in pdf.pages:
+            results.append(_parse_page(page))
+            # Drop the page's cached layout objects once its rows are taken,
+            # so a long statement is not held in memory page after page
+            page.close()
+
+    dates, merchants, amounts, types = [], [], [], []
+    for page_num, ((page_dates, page_merchants, page_amounts, page_types), tables, text) in enumerate(results, start=1):
+        dates.extend(page_dates)
+        merchants.extend(page_merchants)
+        amounts.extend(page_amounts)
+        types.extend(page_types)
+        if debug and text:
+            st.write(f"🔎 Debug Text Page {page_num}", text.split("\n")[:20])
+        if debug:
+            st.write(f"🔎 Debug Tables Page {page_num}", tables[:2] if tables else "No tables detected")  # Print sample tables
+
+    st.info(f"📄 Extracted {len(dates)} rows from {page_count} pages")
+
+    # Build the frame column-wise; amounts are collected as matched text, so
+    # convert and sign them in one vectorized pass (credits are negative).
+    # Always float, even when no amount has decimals; rounded with Python's
+    # round(), which is exact where Series.round's scale-and-rint is not
+    # (12.345 -> 12.35, not 12.34)
+    amounts = pd.to_numeric(pd.Series(amounts, dtype=object).str.replace(",", "", regex=False), errors="coerce").astype("float64")
+    amounts = amounts.map(lambda a: round(a, 2))
+    types = pd.Series(types, dtype=object)
+    df = pd.DataFrame({
+        "Date": pd.Series(dates, dtype=object),
+        "Merchant": pd.Series(merchants, dtype=object),
+        "Amount": amounts.where(types != "CR", -amounts),
+        "Type": types,
+        "Account": account_name,
+    })
+    return df.dropna(subset=["Amount"]).reset_index(drop=True)
 
 # ------------------------------
 # Extract transactions from CSV/XLSX
@@ -177,9 +280,11 @@ def normalize_dataframe(df, account_name):
 
     if "Debit" in df and "Credit" in df:
         df["Amount"] = df["Debit"].fillna(0) - df["Credit"].fillna(0)
-        df["Type"] = df.apply(lambda x: "DR" if x["Debit"] > 0 else "CR", axis=1)
+        df["Type"] = np.where(df["Debit"] > 0, "DR", "CR")
     elif "Amount" in df and "Type" in df:
-        df["Amount"] = df.apply(lambda x: -abs(x["Amount"]) if str(x["Type"]).upper().startswith("CR") else abs(x["Amount"]), axis=1)
+        is_cr = df["Type"].astype(str).str.upper().str.startswith("CR")
+        amt = df["Amount"].abs()
+        df["Amount"] = amt.where(~is_cr, -amt)
     elif "Amount" in df and "Type" not in df:
         df["Type"] = "DR"
 
@@ -191,47 +296,127 @@ def normalize_dataframe(df, account_name):
     df["Account"] = account_name
     return df[["Date", "Merchant", "Amount", "Type", "Account"]]
 
+# ------------------------------
+# Cached extraction (Streamlit reruns the script on every widget change)
+# ------------------------------
+# Cached results live for the server process and are shared by all
+# sessions, so keep only the most recent ones
+@st.cache_data(show_spinner=False, max_entries=32)
+def _parse_upload(file_bytes, file_name, debug=False):
+    """Parse an uploaded statement; keyed on its bytes so reruns skip re-parsing."""
+    if file_name.endswith(".pdf"):
+        return extract_transactions_from_pdf(BytesIO(file_bytes), None, debug=debug)
+    elif file_name.endswith(".csv"):
+        return extract_transactions_from_csv(BytesIO(file_bytes), None)
+    elif file_name.endswith(".xlsx"):
+        return extract_transactions_from_excel(BytesIO(file_bytes), None)
+    return pd.DataFrame()
+
+def extract_transactions(file_bytes, file_name, account_name, debug=False):
+    # The account name is not part of the parse, so renaming an account
+    # only relabels the cached rows (st.cache_data hands back a copy)
+    df = _parse_upload(file_bytes, file_name, debug=debug)
+    df["Account"] = account_name
+    return df
+
 # ------------------------------
 # Categorize expenses
 # ------------------------------
-def categorize_expenses(df):
-    df["Category"] = df["Merchant"].apply(get_category)
+@st.cache_data(show_spinner=False, max_entries=16)
+def categorize_expenses(df, vendors_mtime):
+    """Add a Category column; vendors_mtime keys the cache to the vendors.csv version matched against."""
+    # Statements repeat merchants, so categorize the distinct ones and
+    # expand the result back through the factorized codes
+    codes, uniques = pd.factorize(df["Merchant"].astype(str))
+    per_merchant = _categories_for([m.lower() for m in uniques])
+    df["Category"] = per_merchant[codes]
     return df
 
 # ------------------------------
 # Add new vendor if categorized by user
 # ------------------------------
+_pending_vendors = {}
+
 def add_new_vendor(merchant, category):
+    # Only the in-memory lookup changes here; save_vendor_map writes
+    # vendors.csv once at the end of the script run
+    key = merchant.lower()
+    if key not in _VENDOR_CAT:
+        _VENDOR_LOWERS.append(key)
+    _VENDOR_CAT[key] = category
+    _pending_vendors[key] = category
+    # Not on disk yet, so the vendors_mtime key has not changed
+    categorize_expenses.clear()
+
+def save_vendor_map():
+    """Apply this run's new vendors to vendor_map and write them to vendors.csv once."""
     global vendor_map
-    new_row = pd.DataFrame([[merchant.lower(), category]], columns=["merchant", "category"])
-    vendor_map = pd.concat([vendor_map, new_row], ignore_index=True)
-    vendor_map.drop_duplicates(subset=["merchant"], keep="last", inplace=True)
-    vendor_map.to_csv(VENDOR_FILE, index=False)
+    if not _pending_vendors:
+        return
+    existing = vendor_map["merchant"].isin(_pending_vendors)
+    vendor_map.loc[existing, "category"] = vendor_map.loc[existing, "merchant"].map(_pending_vendors)
+    known = set(vendor_map.loc[existing, "merchant"])
+    new_rows = pd.DataFrame([(m, c) for m, c in _pending_vendors.items() if m not in known], columns=["merchant", "category"])
+    vendor_map = pd.concat([vendor_map, new_rows], ignore_index=True)
+    # Rewrite to a temp file and swap it in, so a crash mid-write never
+    # leaves a truncated vendors.csv
+    tmp_file = VENDOR_FILE + ".tmp"
+    vendor_map.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, VENDOR_FILE)
+    _pending_vendors.clear()
+    load_vendor_map.clear()
 
 # ------------------------------
 # Expense analysis
 # ------------------------------
 def analyze_expenses(df):
     st.write("💰 **Total Spent:**", f"{df['Amount'].sum():,.2f}")
+    # One hash-groupby pass over the transactions; the three views below are
+    # rollups of these (much smaller) partial sums. dropna=False keeps rows
+    # whose other keys are missing, as the per-column groupbys did;
+    # observed=True keeps categorical keys from expanding to every combination.
+    # sort=False: the charts order their own axis, and the top merchants only
+    # need a partial selection (nlargest), not a full sort of every merchant
+    partial = df.groupby(["Category", "Merchant", "Account"], sort=False, dropna=False, observed=True)["Amount"].sum().reset_index()
     st.write("📊 **Expense by Category**")
-    st.bar_chart(df.groupby("Category")["Amount"].sum().round(2))
+    st.bar_chart(partial.groupby("Category", sort=False, observed=True)["Amount"].sum().round(2))
     st.write("🏦 **Top 5 Merchants**")
-    st.dataframe(df.groupby("Merchant")["Amount"].sum().round(2).sort_values(ascending=False).head())
+    st.dataframe(partial.groupby("Merchant", sort=False, observed=True)["Amount"].sum().round(2).nlargest(5))
     st.write("🏦 **Expense by Account**")
-    st.bar_chart(df.groupby("Account")["Amount"].sum().round(2))
+    st.bar_chart(partial.groupby("Account", sort=False, observed=True)["Amount"].sum().round(2))
 
 # ------------------------------
 # Export Helpers
 # ------------------------------
 def convert_df_to_csv(df):
     df["Amount"] = df["Amount"].round(2)
-    return df.to_csv(index=False).encode("utf-8")
+    # Encode straight into a byte buffer, chunk by chunk, instead of building
+    # the whole CSV as one str and then copying it again with .encode()
+    output = BytesIO()
+    df.to_csv(output, index=False, encoding="utf-8")
+    return output.getvalue()
 
 def convert_df_to_excel(df):
     df["Amount"] = df["Amount"].round(2)
     output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Expenses", float_format="%.2f")
+    # constant_memory flushes each row to disk as soon as the next one starts,
+    # so peak memory no longer grows with the row count. It only accepts
+    # row-by-row writes, which DataFrame.to_excel (column by column) does not do.
+    # Merchant names are plain text: skip the per-string formula/URL checks.
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        # Same datetime format pd.ExcelWriter applied to Timestamp cells
+        "default_date_format": "YYYY-MM-DD HH:MM:SS",
+    })
+    worksheet = workbook.add_worksheet("Expenses")
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    worksheet.write_row(0, 0, df.columns.tolist(), header_format)
+    cells = df.astype(object).where(df.notna(), None)
+    for row_num, row in enumerate(cells.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_num, 0, row)
+    workbook.close()
     return output.getvalue()
 
 # ==============================
@@ -245,27 +430,32 @@ debug_mode = st.checkbox("Enable Debug Mode 🔎", value=False)
 uploaded_files = st.file_uploader("Upload Statements", type=["pdf", "csv", "xlsx"], accept_multiple_files=True)
 
 if uploaded_files:
-    all_data = pd.DataFrame(columns=["Date", "Merchant", "Amount", "Type", "Account"])
+    frames = []
 
     for uploaded_file in uploaded_files:
         account_name = st.text_input(f"Enter account name for {uploaded_file.name}", value=uploaded_file.name)
         if account_name:
-            if uploaded_file.name.endswith(".pdf"):
-                df = extract_transactions_from_pdf(uploaded_file, account_name, debug=debug_mode)
-            elif uploaded_file.name.endswith(".csv"):
-                df = extract_transactions_from_csv(uploaded_file, account_name)
-            elif uploaded_file.name.endswith(".xlsx"):
-                df = extract_transactions_from_excel(uploaded_file, account_name)
-            else:
-                df = pd.DataFrame()
-            all_data = pd.concat([all_data, df], ignore_index=True)
+            df = extract_transactions(uploaded_file.getvalue(), uploaded_file.name, account_name, debug=debug_mode)
+            frames.append(df)
+
+    if frames:
+        all_data = pd.concat(frames, ignore_index=True)
+    else:
+        all_data = pd.DataFrame(columns=["Date", "Merchant", "Amount", "Type", "Account"])
 
     if not all_data.empty:
-        all_data = categorize_expenses(all_data)
+        # cdist already fans out across cores; the script just waits on it
+        with st.spinner("Categorizing transactions..."):
+            all_data = categorize_expenses(all_data, _VENDOR_MTIME)
         all_data["Amount"] = all_data["Amount"].round(2)
+        # Few distinct values per column: store integer codes so the
+        # groupbys and table rendering below work on those, not on strings
+        for col in ("Merchant", "Account", "Category"):
+            all_data[col] = all_data[col].astype("category")
 
         st.subheader("📑 Extracted Transactions")
-        st.dataframe(all_data)
+        # Format Amount client-side instead of building a pandas Styler
+        st.dataframe(all_data, column_config={"Amount": st.column_config.NumberColumn(format="%.2f")})
 
         st.subheader("📊 Expense Analysis")
         analyze_expenses(all_data)
@@ -274,3 +464,6 @@ if uploaded_files:
         st.download_button("⬇️ CSV", convert_df_to_csv(all_data), "expenses.csv", "text/csv")
         st.download_button("⬇️ Excel", convert_df_to_excel(all_data),
                            "expenses.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# Persist any vendors categorized during this run
+save_vendor_map()